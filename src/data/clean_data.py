@@ -8,7 +8,9 @@ import argparse
 from typing import List 
 
 from sklearn.preprocessing import LabelEncoder
-import dask.dataframe as da
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 import helper 
@@ -169,38 +171,50 @@ def clean_datasets(
     else:
         files = [f'{single_file[:-4]}_T.csv']
 
-    # Get rid of LOC genes before subsetting 
+    # Get rid of LOC genes before subsetting
     print(f'Number of unique genes across all datasets are {len(unique)}')
-    print(f'Sorting columns and calculating intersection of Dask dataframes')
+    print(f'Streaming each datafile and keeping only the intersecting genes')
 
+    unique = set(unique)
     for file in files:
         print(f'Calculating for {file}')
-        data = (da.read_csv(
-            os.path.join(data_path, 'interim', file),
-            assume_missing=True,
-            header=1, # need this since calculating transpose adds one extra row, still need to figure out why as it doesn't happen on synthetic data 
-            sample=1000000, # May need to make this bigger
-        ))
-        data.columns = [x.split('|')[0].upper() for x in data.columns]
-        
-        print(f'Number of unique genes is {len(unique)} and number of genes in current dataset is {len(data.columns)}')
-        for gene in data.columns:
-            if gene not in unique:
-                print(f'Dropping gene {gene}')
-                data = data.drop(gene, axis=1)
-                data = data.persist()
-
-        data.to_csv(
-            os.path.join(data_path, 'processed', f'{file[:-4]}.csv'),
-            single_file=True,
-            index=False,
+        fpath = os.path.join(data_path, 'interim', file)
+
+        # Grab the raw column names straight from the header line, so the csv reader can skip
+        # unwanted genes at parse time instead of reading and then dropping them
+        with open(fpath) as f:
+            f.readline() # need this since calculating transpose adds one extra row, still need to figure out why as it doesn't happen on synthetic data
+            raw_columns = f.readline().rstrip('\n').split(',')
+
+        keep = [col for col in raw_columns if col.split('|')[0].upper() in unique]
+        print(f'Number of unique genes is {len(unique)} and number of genes in current dataset is {len(raw_columns)}')
+
+        # Stream the csv batch by batch so we never hold the full matrix in memory, and
+        # there's no scheduling overhead like with the old Dask version of this pipeline
+        reader = pacsv.open_csv(
+            fpath,
+            read_options=pacsv.ReadOptions(skip_rows=1, block_size=64 << 20),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=keep,
+                column_types={col: pa.float32() for col in keep},
+            ),
         )
 
+        clean_names = [col.split('|')[0].upper() for col in keep]
+        schema = pa.schema([(name, pa.float32()) for name in clean_names])
+
+        # Write typed, compressed Parquet instead of serializing the float matrix back to text —
+        # far smaller on disk and S3, and downstream readers skip re-parsing ascii entirely
+        outfile = os.path.join(data_path, 'processed', f'{file[:-4]}.parquet')
+        with pq.ParquetWriter(outfile, schema, compression='snappy') as writer:
+            for batch in reader:
+                writer.write_batch(pa.RecordBatch.from_arrays(batch.columns, names=clean_names))
+
         print(f'Uploading {file} to S3')
         if upload:
             helper.upload(
-                os.path.join(data_path, 'processed', f'{file[:-4]}.csv'),
-                os.path.join('jlehrer', 'expression_data', 'clean', f'{file[:-4]}.csv')
+                outfile,
+                os.path.join('jlehrer', 'expression_data', 'clean', f'{file[:-4]}.parquet')
             )
 
 if __name__ == "__main__":
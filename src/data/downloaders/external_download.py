@@ -1,8 +1,11 @@
-import pathlib 
-import os 
+import pathlib
+import os
 import sys
 import argparse
-import urllib 
+import urllib
+import gzip
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import *
 
 from os.path import join, isfile, isdir 
@@ -11,6 +14,25 @@ import helper
 
 here = pathlib.Path(__file__).parent.absolute()
 
+def _up_to_date(path: str, url: str) -> bool:
+    """Checks a local download against the remote Content-Length, so a partial file left by a crashed run is re-fetched
+
+    :param path: Path to the local copy
+    :type path: str
+    :param url: Remote url the file was downloaded from
+    :type url: str
+    :return: True if the local file exists and matches the advertised size
+    :rtype: bool
+    """
+    if not isfile(path):
+        return False
+
+    req = urllib.request.Request(url, method='HEAD')
+    with urllib.request.urlopen(req) as resp:
+        length = resp.headers.get('Content-Length')
+
+    return length is None or os.path.getsize(path) == int(length)
+
 def download_raw_expression_matrices(
     datasets: Dict[str, Tuple[str, str]]=None,
     upload: bool=False,
@@ -38,35 +60,30 @@ def download_raw_expression_matrices(
         print(f'Generating data path {data_path}')
         os.makedirs(data_path, exist_ok=True)
 
-    for file, links in datasets.items():
+    def _fetch_one(file: str, links: Tuple[str, str]) -> None:
         labelfile = f'labels_{file}'
         datalink, labellink = links
 
         datafile_path = join(data_path, file)
         labelfile_path = join(data_path, labelfile)
-        # First, make the required folders if they do not exist 
-        for dir in 'raw':
-            os.makedirs(join(data_path, dir), exist_ok=True)
 
-        # Download and unzip data file if it doesn't exist 
+        # Download and unzip data file if it doesn't exist
         if not isfile(datafile_path):
-            print(f'Downloading zipped data for {file}')
-            urllib.request.urlretrieve(
-                datalink,
-                f'{datafile_path}.gz',
-            )
             if unzip:
-                print(f'Unzipping {file}')
-                os.system(
-                    f'zcat < {datafile_path}.gz > {datafile_path}'
-                )
-
-                print(f'Deleting compressed data')
-                os.system(
-                    f'rm -rf {datafile_path}.gz'
+                # Stream the response through gunzip straight to the destination file, so the
+                # compressed data never hits disk and we skip the zcat subprocess entirely
+                print(f'Downloading and unzipping data for {file}')
+                with urllib.request.urlopen(datalink) as resp:
+                    with gzip.GzipFile(fileobj=resp) as gz, open(datafile_path, 'wb') as out:
+                        shutil.copyfileobj(gz, out, 1 << 20)
+            else:
+                print(f'Downloading zipped data for {file}')
+                urllib.request.urlretrieve(
+                    datalink,
+                    f'{datafile_path}.gz',
                 )
 
-        if not isfile(labelfile_path):
+        if not _up_to_date(labelfile_path, labellink):
             urllib.request.urlretrieve(
                 labellink,
                 labelfile_path,
@@ -80,6 +97,12 @@ def download_raw_expression_matrices(
                 join('jlehrer', 'expression_data', 'raw', file)
             )
 
+    # Downloads are latency-bound, so overlap them across a pool of threads instead of fetching one file at a time
+    with ThreadPoolExecutor(max_workers=int(os.getenv('S3_WORKERS', 16))) as executor:
+        futures = [executor.submit(_fetch_one, file, links) for file, links in datasets.items()]
+        for future in futures:
+            future.result()
+
 def download_labels(
     datasets: Dict[str, Tuple[str, str]]=None,
     upload: bool=False,
@@ -103,8 +126,8 @@ def download_labels(
     for labelfile, (_, labellink) in datasets.items():
         labelfile_path = os.path.join(data_path, f"{labelfile[:-4]}_labels.tsv")
 
-        # Download label file if it doesn't exist 
-        if not os.path.isfile(labelfile_path):
+        # Download label file if it doesn't exist or doesn't match the remote size
+        if not _up_to_date(labelfile_path, labellink):
             print(f'Downloading label for {labelfile}')
             urllib.request.urlretrieve(
                 labellink,
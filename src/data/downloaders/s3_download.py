@@ -1,8 +1,10 @@
-import pathlib 
-import os 
+import pathlib
+import os
 import sys
 import argparse
-import urllib 
+import urllib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from boto3.s3.transfer import TransferConfig
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 import helper 
@@ -10,6 +12,10 @@ import helper
 here = pathlib.Path(__file__).parent.absolute()
 data_path = os.path.join(here, '..', '..', 'data')
 
+# Large objects additionally download as parallel multipart ranges on top of the
+# file-level thread pool below
+_transfer_config = TransferConfig(multipart_threshold=8 << 20, max_concurrency=10)
+
 def _download_from_key(
     key: str, 
     localpath: str,
@@ -29,89 +35,60 @@ def _download_from_key(
         print(f'Download path {localpath} doesn\'t exist, creating...')
         os.makedirs(localpath, exist_ok=True)
 
-    for f in reduced_files:
-        if not os.path.isfile(os.path.join(data_path, 'processed', f.split('/')[-1])):
+    def _fetch(f: str) -> None:
+        localfile = os.path.join(localpath, f.split('/')[-1]) # Just the file name in the list of objects
+
+        # Compare against the remote object's size/hash rather than bare os.path.isfile,
+        # so a truncated download from a previous crash gets re-fetched
+        if not helper.up_to_date(localfile, f):
             print(f'Downloading {f} from S3')
-            helper.download(
-                f,
-                os.path.join(localpath, f.split('/')[-1]) # Just the file name in the list of objects
-            )
-def download_clean_from_s3(
+            helper.s3_client.download_file('braingeneersdev', f, localfile, Config=_transfer_config)
+
+    # S3 fetches are latency-bound, so overlap them with a thread pool instead of downloading serially
+    with ThreadPoolExecutor(max_workers=int(os.getenv('S3_WORKERS', 16))) as executor:
+        futures = [executor.submit(_fetch, f) for f in reduced_files]
+        for future in as_completed(futures):
+            future.result()
+# {kind: (S3 key prefix, subfolder under data/)}. 'clean' is kept as an alias for 'processed'
+DATASETS = {
+    'clean': (os.path.join('jlehrer', 'expression_data', 'processed'), 'processed'),
+    'processed': (os.path.join('jlehrer', 'expression_data', 'processed'), 'processed'),
+    'interim': (os.path.join('jlehrer', 'expression_data', 'interim'), 'interim'),
+    'raw': (os.path.join('jlehrer', 'expression_data', 'raw'), 'raw'),
+}
+
+def download_from_s3(
+    kind: str,
     file: str=None,
     local_path: str=None,
 ) -> None:
-    """Downloads the cleaned data from s3 to be used in model training
+    """Downloads expression data of the given kind from the braingeneersdev S3 bucket.
+    Raw data is the unprocessed download, interim data is in the correct structural format but
+    has not been cleaned, and processed (clean) data is ready for model training.
 
-    :param file: file name to download from braingeneersdev S3 bucket, defaults to None
+    :param kind: Which data to download, one of the keys in DATASETS
+    :type kind: str
+    :param file: file name to download from braingeneersdev S3 bucket, or None to download everything of this kind, defaults to None
     :type file: str, optional
     :param local_path: path to download file to, defaults to None
     :type local_path: str, optional
-    """    
-    os.makedirs(os.path.join(data_path, 'processed'), exist_ok=True)
-    if not file: # No single file passed, so download recursively
-        print('Downloading all clean data...')
-        key = os.path.join('jlehrer', 'expression_data', 'processed')
-        local_path = os.path.join(data_path, 'processed')
-
-        _download_from_key(key, local_path) 
-    else:
-        print(f'Downloading {file} from clean data')
-        local_path = (os.path.join(data_path, 'processed', file) if not local_path else local_path)
-        helper.download(
-            os.path.join('jlehrer', 'expression_data', 'processed', file),
-            local_path
-        )
-
-def download_interim_from_s3(
-    file: str=None,
-    local_path: str=None,
-) -> None:
-    """Downloads the interim data from S3. Interim data is in the correct structural format but has not been cleaned
-
-    :param file: _description_, defaults to None
-    :type file: str, optional
-    :param local_path: _description_, defaults to None
-    :type local_path: str, optional
     """
-    os.makedirs(os.path.join(data_path, 'interim'), exist_ok=True)
+    if kind not in DATASETS:
+        raise ValueError('Unknown type specified for data downloading.')
 
-    if not file:
-        print('Downloading all interim data')
-        key = os.path.join('jlehrer', 'expression_data', 'interim')
-        local_path = os.path.join(data_path, 'interim')
-        _download_from_key(key, local_path)
-    else:
-        print(f'Downloading {file} from interim data')
-        local_path = (os.path.join(data_path, 'interim', file) if not local_path else local_path)
-        helper.download(
-            os.path.join('jlehrer', 'expression_data', 'interim', file),
-            local_path,
-        )
-        
-def download_raw_from_s3(
-    file: str=None,
-    local_path: str=None,
-) -> None:
-    """Downloads the raw expression matrices from s3
+    key_prefix, subdir = DATASETS[kind]
+    target = os.path.join(data_path, subdir)
+    os.makedirs(target, exist_ok=True)
 
-
-    :param file: _description_, defaults to None
-    :type file: str, optional
-    :param local_path: _description_, defaults to None
-    :type local_path: str, optional
-    """
-    os.makedirs(os.path.join(data_path, 'raw'), exist_ok=True)
-    if not file: 
-        print('Downloading all raw data')
-        key = os.path.join('jlehrer', 'expression_data', 'raw')
-        local_path = os.path.join(data_path, 'raw')
-        _download_from_key(key, local_path)
+    if not file: # No single file passed, so download recursively
+        print(f'Downloading all {kind} data')
+        _download_from_key(key_prefix, target)
     else:
-        print(f'Downloading {file} from raw data')
-        local_path = (os.path.join(data_path, 'raw', file) if not local_path else local_path)
+        print(f'Downloading {file} from {kind} data')
+        local_path = (os.path.join(target, file) if not local_path else local_path)
         helper.download(
-            os.path.join('jlehrer', 'expression_data', 'raw', file), 
-            local_path
+            os.path.join(key_prefix, file),
+            local_path,
         )
 
 if __name__ == "__main__":
@@ -148,11 +125,4 @@ if __name__ == "__main__":
     if local is not None and not key:
         parser.error('Error: If --local-name is passed in specified download, s3 key must be passed as well via --key')
 
-    if type == 'interim':
-        download_interim_from_s3(key, local)
-    elif type == 'raw':
-        download_raw_from_s3(key, local)
-    elif type == 'processed' or type == 'clean':
-        download_clean_from_s3(key, local)
-    else:
-        raise ValueError('Unknown type specified for data downloading.')
\ No newline at end of file
+    download_from_s3(type, key, local)
\ No newline at end of file
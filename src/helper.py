@@ -1,11 +1,14 @@
 import boto3
-import os 
-import matplotlib.pyplot as plt 
-import seaborn as sns 
-import pathlib 
+import hashlib
+import os
+import shutil
+import matplotlib.pyplot as plt
+import seaborn as sns
+import pathlib
 import json
-import pandas as pd 
-from typing import * 
+import pandas as pd
+import pyarrow.fs
+from typing import *
 
 S3_CLUSTER_LABEL_PATH = os.path.join('jlehrer', 'primary_cluster_labels')
 S3_CLEAN_DATA_PATH = 'jlehrer'
@@ -60,10 +63,27 @@ s3 = boto3.resource(
     aws_secret_access_key=access,
 )
 
+# Plain client for listing/head calls and multipart transfers; shared across threads, which
+# boto3 documents as safe for clients (unlike resources)
+s3_client = boto3.client(
+    's3',
+    endpoint_url="https://s3-west.nrp-nautilus.io/",
+    aws_access_key_id=key,
+    aws_secret_access_key=access,
+)
+
+# Arrow's native S3 filesystem moves bytes in C++ without the per-call Python overhead
+# of boto3/s3fs, so use it for the actual file transfers below
+fs = pyarrow.fs.S3FileSystem(
+    endpoint_override="https://s3-west.nrp-nautilus.io/",
+    access_key=key,
+    secret_key=access,
+)
+
 def upload(file_name, remote_name=None) -> None:
     """
     Uploads a file to the braingeneersdev S3 bucket
-    
+
     Parameters:
     file_name: Local file to upload
     remote_name: Key for S3 bucket. Default is file_name
@@ -71,26 +91,55 @@ def upload(file_name, remote_name=None) -> None:
     if remote_name == None:
         remote_name = file_name
 
-    s3.Bucket('braingeneersdev').upload_file(
-        Filename=file_name,
-        Key=remote_name,
-)
+    with open(file_name, 'rb') as f, fs.open_output_stream(f'braingeneersdev/{remote_name}') as out:
+        shutil.copyfileobj(f, out, 16 << 20)
 
 def download(remote_name, file_name=None) -> None:
     """
-    Downloads a file from the braingeneersdev S3 bucket 
+    Downloads a file from the braingeneersdev S3 bucket
 
     Parameters:
     remote_name: S3 key to download. Must be a single file
     file_name: File name to download to. Default is remote_name
     """
     if file_name == None:
-        file_name == remote_name
+        file_name = remote_name
 
-    s3.Bucket('braingeneersdev').download_file(
-        Key=remote_name,
-        Filename=file_name,
-    )
+    with fs.open_input_stream(f'braingeneersdev/{remote_name}', buffer_size=16 << 20) as obj, open(file_name, 'wb') as out:
+        shutil.copyfileobj(obj, out, 16 << 20)
+
+def up_to_date(local_name, remote_name) -> bool:
+    """
+    Checks whether a local copy of an S3 object exists and matches the remote object,
+    so a partial download left behind by a crashed run isn't silently treated as complete.
+
+    Parameters:
+    local_name: Path to the local copy
+    remote_name: S3 key of the object in the braingeneersdev bucket
+
+    Returns:
+    bool: True if the local file exists and matches the remote object's size (and md5, when comparable)
+    """
+    if not os.path.isfile(local_name):
+        return False
+
+    # Head through the client, not the resource: this runs inside download thread pools,
+    # and boto3 only documents clients as thread-safe
+    head = s3_client.head_object(Bucket='braingeneersdev', Key=remote_name)
+    if os.path.getsize(local_name) != head['ContentLength']:
+        return False
+
+    # Multipart uploads don't report a plain md5 ETag, so only verify the hash when we can
+    etag = head['ETag'].strip('"')
+    if '-' not in etag:
+        md5 = hashlib.md5()
+        with open(local_name, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                md5.update(chunk)
+
+        return md5.hexdigest() == etag
+
+    return True
 
 def umap_plot(data, title=None) -> None:
     """
@@ -128,8 +177,13 @@ def list_objects(prefix: str) -> list:
     List[str]: List of objects with given prefix
     """
 
-    objs = s3.Bucket('braingeneersdev').objects.filter(Prefix=prefix)
-    return [x.key for x in objs]
+    # Paginate explicitly so prefixes with more than 1000 objects are listed in full
+    paginator = s3_client.get_paginator('list_objects_v2')
+    return [
+        obj['Key']
+        for page in paginator.paginate(Bucket='braingeneersdev', Prefix=prefix)
+        for obj in page.get('Contents', [])
+    ]
 
 def fix_labels(
     file: str, 
@@ -173,9 +227,14 @@ def gene_intersection() -> List[str]:
     for file in files:
         fpath = os.path.join(here, '..', 'data', 'interim', file)
         if os.path.isfile(fpath):
-            # Read in columns, split by | (since some are PVALB|PVALB), and make sure all are uppercase
-            temp = pd.read_csv(fpath, nrows=1, header=1).columns 
-            temp = [x.split('|')[0].upper().strip() for x in temp]
+            # Read the header line directly instead of going through pd.read_csv, which would
+            # also have to parse and type a full data row just to hand back the columns
+            with open(fpath) as f:
+                f.readline() # transposing adds an extra leading line, same reason as header=1 before
+                header = f.readline().rstrip('\n')
+
+            # Split by | (since some are PVALB|PVALB), and make sure all are uppercase
+            temp = [x.split('|')[0].upper().strip() for x in header.split(',')]
             cols.append(set(temp))
 
     unique = list(set.intersection(*cols))
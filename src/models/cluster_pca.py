@@ -3,16 +3,29 @@ import os
 import sys
 import argparse
 
-import pandas as pd 
+import pandas as pd
 import numpy as np
-import hdbscan 
+import hdbscan
+
+# Use the GPU implementation when cuML is available, since the kNN and MST steps that
+# dominate HDBSCAN parallelize well there; otherwise fall back to CPU hdbscan
+try:
+    from cuml.cluster import HDBSCAN as cumlHDBSCAN
+    import cupy as cp
+except ImportError:
+    cumlHDBSCAN = None
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 from helper import upload, S3_CLUSTER_LABEL_PATH
 
 def cluster(data, min_cluster_size):
-    clusterer = hdbscan.HDBSCAN(min_cluster_size=min_cluster_size, core_dist_n_jobs=1)
-    return clusterer.fit(data)
+    if cumlHDBSCAN is not None:
+        clusterer = cumlHDBSCAN(min_cluster_size=min_cluster_size)
+        clusterer.fit(cp.asarray(data.values, dtype=cp.float32))
+        return cp.asnumpy(clusterer.labels_)
+
+    clusterer = hdbscan.HDBSCAN(min_cluster_size=min_cluster_size, core_dist_n_jobs=-1)
+    return clusterer.fit(data).labels_
 
 def generate_labels(COMP, min_cluster_size):
     here = pathlib.Path(__file__).parent.absolute()
@@ -23,10 +36,9 @@ def generate_labels(COMP, min_cluster_size):
     primary = pd.read_csv(os.path.join(data_path, f'pca_components_{COMP}_primary.csv'))
 
     print('Computing primary clusters')
-    prim_clusters = cluster(primary, min_cluster_size)
+    prim_labels = cluster(primary, min_cluster_size)
 
     print('Getting labels and writing to csv')
-    prim_labels = np.array(prim_clusters.labels_)
 
     np.savetxt(fname, prim_labels, delimiter=',', header='label')
 
@@ -1,26 +1,118 @@
 import linecache
-from multiprocessing.sharedctypes import Value 
+from multiprocessing.sharedctypes import Value
 from typing import *
-from functools import cached_property, partial
-from itertools import chain 
+from functools import cached_property, lru_cache, partial
+from itertools import chain
 import inspect
-import warnings 
+import io
+import json
+import warnings
 import pathlib
 
-import pandas as pd 
+import pandas as pd
 import torch
 import numpy as np
-import scanpy as sc 
+import scanpy as sc
+from pyarrow import csv as pacsv
 
 from torch.utils.data import Dataset, DataLoader, ConcatDataset
+from joblib import Parallel, delayed
 from sklearn.model_selection import train_test_split
 from sklearn.utils.class_weight import compute_class_weight
 from scipy.sparse import issparse
 import pytorch_lightning as pl 
 
-import sys, os 
+import sys, os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _parse_line(buf, out, delim): # pragma: no cover
+        """Hand-rolled atof over the raw bytes of a csv line, writing into a preallocated
+        float32 array. Numba compiles this to tight scalar code with no interpreter overhead,
+        so the cold (no-memmap) path isn't bottlenecked on parsing 20k-column lines.
+
+        :param buf: The line as a uint8 array, from np.frombuffer(line.encode('ascii'), ...)
+        :param out: Preallocated float32 output array, one slot per column
+        :param delim: Delimiter byte, e.g. ord(',')
+        :return: Number of columns parsed
+        """
+        n = buf.shape[0]
+        i = 0
+        col = 0
+        while i < n and col < out.shape[0]:
+            while i < n and (buf[i] == 32 or buf[i] == 9): # skip leading whitespace
+                i += 1
+
+            sign = np.float32(1.0)
+            if i < n and (buf[i] == 43 or buf[i] == 45): # +/-
+                if buf[i] == 45:
+                    sign = np.float32(-1.0)
+                i += 1
+
+            value = 0.0
+            while i < n and 48 <= buf[i] <= 57:
+                value = value * 10.0 + (buf[i] - 48)
+                i += 1
+
+            if i < n and buf[i] == 46: # decimal point
+                i += 1
+                place = 0.1
+                while i < n and 48 <= buf[i] <= 57:
+                    value += (buf[i] - 48) * place
+                    place *= 0.1
+                    i += 1
+
+            if i < n and (buf[i] == 101 or buf[i] == 69): # e/E exponent
+                i += 1
+                esign = 1
+                if i < n and (buf[i] == 43 or buf[i] == 45):
+                    if buf[i] == 45:
+                        esign = -1
+                    i += 1
+                exp = 0
+                while i < n and 48 <= buf[i] <= 57:
+                    exp = exp * 10 + (buf[i] - 48)
+                    i += 1
+                value *= 10.0 ** (esign * exp)
+
+            out[col] = sign * np.float32(value)
+            col += 1
+
+            while i < n and buf[i] != delim: # advance past anything left before the next delimiter
+                i += 1
+            i += 1
+
+        return col
+
+def _read_label_csv(
+    path: str,
+    columns: List[str]=None,
+    sep: str=',',
+) -> pd.DataFrame:
+    """
+    Read a labelfile with Arrow's multithreaded csv reader, only materializing the needed columns.
+
+    :param path: Path to label csv file
+    :type path: str
+    :param columns: Columns to read, or None for all of them, defaults to None
+    :type columns: List[str], optional
+    :param sep: separator for the labelfile, defaults to ','
+    :type sep: str, optional
+    :return: The labelfile as a DataFrame
+    :rtype: pd.DataFrame
+    """
+    return pacsv.read_csv(
+        path,
+        parse_options=pacsv.ParseOptions(delimiter=sep),
+        convert_options=pacsv.ConvertOptions(include_columns=columns),
+    ).to_pandas()
+
 class GeneExpressionData(Dataset):
     def __init__(
         self, 
@@ -31,8 +123,10 @@ class GeneExpressionData(Dataset):
         skip: int=3,
         cast: bool=True,
         sep: bool=',',
-        index_col: str=None, 
+        index_col: str=None,
         columns: List[any]=None,
+        labeldf: pd.DataFrame=None,
+        scale: bool=False,
         **kwargs, # To handle extraneous inputs
     ):
         """
@@ -63,6 +157,12 @@ class GeneExpressionData(Dataset):
         :type index_col: str, optional
         :param sep: separator for labelfile and datafile, defaults to ','
         :type sep: str, optional
+        :param labeldf: already-read labelfile, so callers that have the frame in hand don't force a re-read, defaults to None
+        :type labeldf: pd.DataFrame, optional
+        :param scale: scale each gene by its global maximum, precomputed by build_memmap. Unlike a per-sample
+            reduction this costs nothing on the hot path since the per-gene maxima are calculated once
+            during the memmap build. Only available when a memmap has been built, defaults to False
+        :type scale: bool, optional
         """
 
         self.filename = filename
@@ -75,10 +175,60 @@ class GeneExpressionData(Dataset):
         self.sep = sep
         self._cols = columns
 
+        # Only materialize the columns we actually use, and let Arrow's multithreaded reader
+        # do the parsing. Callers that already read the labelfile can hand it in via labeldf
+        if labeldf is None:
+            labeldf = _read_label_csv(
+                labelname,
+                columns=[col for col in (index_col, class_label) if col is not None],
+                sep=self.sep,
+            )
+
         if indices is None:
-            self._labeldf = pd.read_csv(labelname, sep=self.sep)
+            self._labeldf = labeldf
         else:
-            self._labeldf = pd.read_csv(labelname, sep=self.sep).loc[indices, :].reset_index(drop=True)
+            self._labeldf = labeldf.loc[indices, :].reset_index(drop=True)
+
+        # If a binary memmap of the datafile has been built (see build_memmap), read samples
+        # from it directly instead of parsing csv text per __getitem__ call. This is much faster,
+        # since getting a sample becomes a single contiguous read instead of tokenizing + casting a line of text
+        self._memmap = None
+        self._scale = None
+        self._scratch = None # Per-instance parse buffer, allocated lazily; see _parse_csv_line
+        memmap_path = f'{filename}.f32'
+        if pathlib.Path(filename).suffix == '.npy':
+            # Prebuilt binary matrix from build_npy: mmap it once and serve rows directly.
+            # The mapping survives DataLoader worker forks, so num_workers > 0 is safe here
+            self._memmap = np.load(filename, mmap_mode='r')
+
+            if self._cols is None:
+                warnings.warn(f'{self.__class__.__name__} initialized from a .npy matrix without columns. Pass columns= if training with multiple Datasets with potentially different genes.')
+        elif os.path.isfile(memmap_path) and os.path.isfile(f'{memmap_path}.json'):
+            with open(f'{memmap_path}.json') as f:
+                meta = json.load(f)
+
+            self._memmap = np.memmap(
+                memmap_path,
+                dtype=np.float32,
+                mode='r',
+                shape=tuple(meta['shape']),
+            )
+
+            if self._cols is None:
+                self._cols = meta['columns']
+
+            if scale and meta.get('scale') is not None:
+                scale_vec = np.asarray(meta['scale'], dtype=np.float32)
+                self._scale = np.where(scale_vec == 0, 1, scale_vec) # Don't divide all-zero genes by zero
+        elif scale:
+            warnings.warn(f'{scale = } passed but no memmap with precomputed per-gene maxima exists for {filename}. Run build_memmap first, continuing unscaled.')
+
+        # Cache the hot-path lookups as plain numpy arrays. Label-based .loc indexing costs
+        # a few microseconds per call, which dominates __getitem__ once csv parsing is gone
+        self._data_indices = (
+            self._labeldf[self.index_col].to_numpy(dtype=np.int64) if self.index_col is not None else None
+        )
+        self._labels = self._labeldf[self.class_label].to_numpy()
 
     def __getitem__(self, idx: int):
         """Get sample at index
@@ -102,22 +252,88 @@ class GeneExpressionData(Dataset):
 
         # The actual line in the datafile to get, corresponding to the number in the self.index_col values, otherwise the line at index "idx"
         data_index = (
-            self._labeldf.loc[idx, self.index_col] if self.index_col is not None else idx
+            int(self._data_indices[idx]) if self._data_indices is not None else idx
         )
 
-        # get gene expression for current cell from csv file
-        # We skip some lines because we're reading directly from 
-        line = linecache.getline(self.filename, data_index + self.skip)
-        
-        if self.cast:
-            data = torch.from_numpy(np.array(line.split(self.sep), dtype=np.float32)).float()
+        if self._memmap is not None:
+            # Row is already parsed and binary, so this is just a contiguous read. The np.array
+            # call also casts float16 .npy matrices back up to float32 for training
+            data = np.array(self._memmap[data_index], dtype=np.float32)
+            if self._scale is not None:
+                data /= self._scale
+            data = (torch.from_numpy(data) if self.cast else data)
         else:
-            data = np.array(line.split(self.sep))
+            # get gene expression for current cell from csv file
+            # We skip some lines because we're reading directly from
+            line = linecache.getline(self.filename, data_index + self.skip)
 
-        label = self._labeldf.loc[idx, self.class_label]
+            if self.cast:
+                data = torch.from_numpy(self._parse_csv_line(line))
+            else:
+                data = np.array(line.split(self.sep))
+
+        label = self._labels[idx]
 
         return data, label
 
+    def _parse_csv_line(self, line: str) -> np.ndarray:
+        """Parse one csv line of the datafile into a float32 array.
+
+        Uses the Numba-compiled _parse_line into a reused per-instance scratch buffer when numba
+        is installed, otherwise falls back to np.fromstring, which still parses the line in a single
+        C pass. DataLoader workers each fork their own copy of the dataset, so each worker
+        gets its own scratch buffer and there is no contention.
+
+        :param line: One line of the datafile, as returned by linecache
+        :type line: str
+        :return: The parsed row
+        :rtype: np.ndarray
+        """
+        if njit is None:
+            return np.fromstring(line, sep=self.sep, dtype=np.float32)
+
+        if self._scratch is None:
+            self._scratch = np.empty(line.count(self.sep) + 1, dtype=np.float32)
+
+        n = _parse_line(
+            np.frombuffer(line.encode('ascii'), dtype=np.uint8),
+            self._scratch,
+            ord(self.sep),
+        )
+        return self._scratch[:n].copy()
+
+    def __getitems__(self, idxs: List[int]):
+        """Vectorized batch fetch, recognized by the PyTorch DataLoader when present.
+
+        Instead of paying the per-sample Python overhead of one __getitem__ call per index, we look up
+        all the data indices at once and issue a single vectorized read, either as a memmap fancy-index or
+        one np.loadtxt pass over the needed csv lines. The returned list is handed to the collate_fn as usual.
+
+        :param idxs: List of numerical indices between 0, len(self) - 1
+        :type idxs: List[int]
+        :return: List of data, label samples
+        :rtype: List[Tuple[torch.Tensor, Any]]
+        """
+        idxs = list(idxs)
+
+        data_indices = (
+            self._data_indices[idxs] if self._data_indices is not None else np.array(idxs, dtype=np.int64)
+        )
+        labels = self._labels[idxs]
+
+        if self._memmap is not None:
+            batch = np.array(self._memmap[data_indices], dtype=np.float32)
+            if self._scale is not None:
+                batch /= self._scale
+        else:
+            lines = [linecache.getline(self.filename, int(i) + self.skip) for i in data_indices]
+            batch = np.loadtxt(io.StringIO(''.join(lines)), delimiter=self.sep, dtype=np.float32, ndmin=2)
+
+        if self.cast:
+            batch = torch.from_numpy(batch)
+
+        return list(zip(batch, labels))
+
     def __len__(self):
         return len(self._labeldf) # number of total samples 
 
@@ -345,6 +561,59 @@ class SequentialLoader:
     def __iter__(self):
         yield from chain(*self.dataloaders)
 
+class FastTensorDataLoader:
+    """
+    A DataLoader-like object for a set of in-memory tensors that is much faster than
+    TensorDataset + DataLoader, since the stock DataLoader grabs individual indices of
+    the dataset and calls collate on each batch (slow).
+
+    :param tensors: tensors to serve batches from. Must have the same length at dim 0
+    :type tensors: torch.Tensor
+    :param batch_size: batch size to load, defaults to 32
+    :type batch_size: int, optional
+    :param shuffle: if True, shuffle the data in-place whenever an iterator is created from this object, defaults to False
+    :type shuffle: bool, optional
+    """
+    def __init__(self, *tensors, batch_size: int=32, shuffle: bool=False):
+        assert all(t.shape[0] == tensors[0].shape[0] for t in tensors)
+
+        # Pin once up front so every batch transfer to the GPU can be an async copy
+        self.tensors = (
+            [t.pin_memory() for t in tensors] if torch.cuda.is_available() else list(tensors)
+        )
+
+        self.dataset_len = self.tensors[0].shape[0]
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+        n_batches, remainder = divmod(self.dataset_len, self.batch_size)
+        self.n_batches = (n_batches + 1 if remainder > 0 else n_batches)
+
+    def __iter__(self):
+        # Shuffle an index permutation rather than materializing a shuffled copy of every
+        # tensor per epoch; batches gather through the permutation in __next__ instead
+        self.perm = (torch.randperm(self.dataset_len) if self.shuffle else None)
+
+        self.i = 0
+        return self
+
+    def __next__(self):
+        if self.i >= self.dataset_len:
+            raise StopIteration
+
+        if self.perm is None:
+            # Contiguous slicing, no copy at all
+            batch = tuple(t[self.i:self.i + self.batch_size] for t in self.tensors)
+        else:
+            idx = self.perm[self.i:self.i + self.batch_size]
+            batch = tuple(torch.index_select(t, 0, idx) for t in self.tensors)
+
+        self.i += self.batch_size
+        return batch
+
+    def __len__(self):
+        return self.n_batches
+
 def _collate_with_refgenes(
     sample: List[tuple], 
     refgenes: List[str], 
@@ -428,6 +697,27 @@ def _transform_sample(
 
     return data 
 
+@lru_cache(maxsize=None)
+def _alignment_indices(
+    currgenes: Tuple[str, ...],
+    refgenes: Tuple[str, ...],
+) -> np.ndarray:
+    """
+    Compute the indices into currgenes that align a sample with the sorted intersection of currgenes and refgenes.
+
+    Cached since every sample in a dataset shares the same (currgenes, refgenes) pair, so the
+    O(G log G) intersection is paid once instead of on every collate call.
+
+    :param currgenes: Tuple of genes for the current sample
+    :type currgenes: Tuple[str, ...]
+    :param refgenes: Tuple of reference genes we want to keep
+    :type refgenes: Tuple[str, ...]
+    :return: Indices into currgenes, in sorted intersection order
+    :rtype: np.ndarray
+    """
+    intersection = np.intersect1d(currgenes, refgenes, return_indices=True)
+    return intersection[1] # List of indices in currgenes that equal sorted(refgenes)
+
 def clean_sample(
     sample: torch.Tensor,
     refgenes: List[str],
@@ -445,15 +735,101 @@ def clean_sample(
     :return: Sample reordered and intersected with the list of refgenes
     :rtype: torch.Tensor
     """
-    
-    intersection = np.intersect1d(currgenes, refgenes, return_indices=True)
-    indices = intersection[1] # List of indices in sorted(currgenes) that equal sorted(refgenes)
-    
+
+    indices = _alignment_indices(tuple(currgenes), tuple(refgenes))
+
     axis = (1 if sample.ndim == 2 else 0)
-    sample = np.sort(sample, axis=axis)
     sample = np.take(sample, indices, axis=axis)
 
-    return torch.from_numpy(sample)
+    return torch.from_numpy(np.ascontiguousarray(sample))
+
+def build_memmap(
+    filename: str,
+    out_path: str=None,
+    skip: int=3,
+    sep: str=',',
+    chunksize: int=1000,
+) -> str:
+    """
+    One-time preprocessing step that converts a delimited datafile into a binary float32 memmap,
+    so GeneExpressionData can read samples with a single contiguous read instead of parsing csv text per sample.
+
+    The memmap is written next to the datafile as filename.f32, along with a filename.f32.json metadata file
+    containing the matrix shape and column names. GeneExpressionData automatically detects and uses these files.
+
+    :param filename: Path to csv data file, where rows are samples and columns are features
+    :type filename: str
+    :param out_path: Path to write the memmap to, defaults to filename + '.f32'
+    :type out_path: str, optional
+    :param skip: number of lines to skip in datafile csv, consistent with GeneExpressionData, defaults to 3
+    :type skip: int, optional
+    :param sep: separator for the datafile, defaults to ','
+    :type sep: str, optional
+    :param chunksize: Number of csv rows to parse per chunk, so we never hold the full matrix in memory, defaults to 1000
+    :type chunksize: int, optional
+    :return: Path to the created memmap file
+    :rtype: str
+    """
+    out_path = (out_path if out_path is not None else f'{filename}.f32')
+
+    # Grab the column names the same way GeneExpressionData.features does
+    header = linecache.getline(filename, skip - 1)
+    columns = [x.split('|')[0].upper().strip() for x in header.split(sep)]
+
+    n_rows = 0
+    col_max = None
+    with open(out_path, 'wb') as out:
+        # skiprows=skip - 1 so the first chunk row lines up with data_index == 0 in __getitem__
+        for chunk in pd.read_csv(filename, skiprows=skip - 1, header=None, sep=sep, dtype=np.float32, chunksize=chunksize):
+            arr = np.ascontiguousarray(chunk.to_numpy(dtype=np.float32))
+            out.write(arr.tobytes())
+            n_rows += arr.shape[0]
+
+            # Track the per-gene maximum in the same streaming pass, so samples can later be
+            # scaled without recomputing a reduction per sample on the training hot path
+            chunk_max = np.max(arr, axis=0)
+            col_max = (chunk_max if col_max is None else np.maximum(col_max, chunk_max))
+
+    with open(f'{out_path}.json', 'w') as f:
+        json.dump({
+            'shape': [n_rows, len(columns)],
+            'columns': columns,
+            'scale': (col_max.tolist() if col_max is not None else None),
+        }, f)
+
+    return out_path
+
+def build_npy(
+    filename: str,
+    out_path: str=None,
+    columns: List[str]=None,
+    dtype=np.float16,
+) -> str:
+    """
+    Convert a cleaned Parquet expression matrix into a single .npy file that GeneExpressionData
+    can mmap directly, so the training hot path is a contiguous binary read instead of any text parsing.
+
+    float16 halves the bytes moved per sample vs float32; samples are cast back up to float32
+    on read. Only use this when the full matrix fits in memory during conversion.
+
+    :param filename: Path to the Parquet file written by clean_data.py
+    :type filename: str
+    :param out_path: Path to write the .npy to, defaults to the datafile path with a .npy suffix
+    :type out_path: str, optional
+    :param columns: Subset of gene columns to keep, or None for all of them, defaults to None
+    :type columns: List[str], optional
+    :param dtype: dtype to store the matrix as, defaults to np.float16
+    :return: Path to the created .npy file
+    :rtype: str
+    """
+    import pyarrow.parquet as pq
+
+    out_path = (out_path if out_path is not None else f'{os.path.splitext(filename)[0]}.npy')
+
+    arr = pq.read_table(filename, columns=columns).to_pandas().to_numpy(dtype=dtype)
+    np.save(out_path, arr)
+
+    return out_path
 
 def generate_single_dataset(
     datafile: str,
@@ -520,20 +896,28 @@ def generate_single_dataset(
             print(f'Extension {suffix} not recognized, \
                 interpreting as .csv. To silence this warning, pass in explicit file types.')
 
+        # Read the labelfile once here and share the frame with the generated Datasets below,
+        # rather than re-reading it per split
+        labeldf = _read_label_csv(
+            labelfile,
+            columns=[col for col in (index_col, class_label) if col is not None],
+            sep=sep,
+        )
+
         if subset is not None:
-            current_labels = pd.read_csv(labelfile, sep=sep).loc[subset, class_label]
+            current_labels = labeldf.loc[subset, class_label]
         else:
-            current_labels = pd.read_csv(labelfile, sep=sep).loc[:, class_label]
+            current_labels = labeldf.loc[:, class_label]
 
         # Make stratified split on labels
         trainsplit, valsplit = train_test_split(
-            current_labels, 
-            stratify=(current_labels if stratify else None), 
+            current_labels,
+            stratify=(current_labels if stratify else None),
             test_size=test_prop
         )
         trainsplit, testsplit = train_test_split(
-            trainsplit, 
-            stratify=(trainsplit if stratify else None), 
+            trainsplit,
+            stratify=(trainsplit if stratify else None),
             test_size=test_prop
         )
 
@@ -545,10 +929,11 @@ def generate_single_dataset(
                 indices=indices,
                 index_col=index_col,
                 sep=sep,
+                labeldf=labeldf,
                 *args,
                 **kwargs,
             )
-            for indices in [trainsplit.index, valsplit.index, testsplit.index]  
+            for indices in [trainsplit.index, valsplit.index, testsplit.index]
         )
 
     return train, val, test 
@@ -564,15 +949,37 @@ def generate_single_dataloader(
     stratify: bool,
     batch_size: int,
     num_workers: int,
+    in_memory: bool=False,
     *args,
     **kwargs,
 ) -> Tuple[CollateLoader, CollateLoader, CollateLoader]:
     """
     Generates a train, val, test CollateLoader
 
+    If in_memory is passed and the datafile is delimited text, the entire matrix is loaded
+    into a tensor once and served through FastTensorDataLoaders, which skips the per-index
+    __getitem__ and collate overhead of the stock DataLoader. Only use this when the dataset
+    comfortably fits in memory.
+
     :return: train, val, test loaders
     :rtype: Tuple[CollateLoader, CollateLoader, CollateLoader]
     """
+    if in_memory and pathlib.Path(datafile).suffix != '.h5ad':
+        return _generate_in_memory_dataloaders(
+            datafile=datafile,
+            labelfile=labelfile,
+            class_label=class_label,
+            index_col=index_col,
+            test_prop=test_prop,
+            sep=sep,
+            subset=subset,
+            stratify=stratify,
+            batch_size=batch_size,
+            refgenes=kwargs.get('refgenes'),
+            currgenes=kwargs.get('currgenes'),
+            normalize=kwargs.get('normalize', False),
+            skip=kwargs.get('skip', 3),
+        )
 
     train, val, test = generate_single_dataset(
         datafile=datafile,
@@ -589,7 +996,7 @@ def generate_single_dataloader(
 
     loaders = (
         CollateLoader(
-                dataset=dataset, 
+                dataset=dataset,
                 batch_size=batch_size,
                 num_workers=num_workers,
                 *args,
@@ -598,7 +1005,83 @@ def generate_single_dataloader(
         for dataset in [train, val, test]
     )
 
-    return loaders 
+    return loaders
+
+def _generate_in_memory_dataloaders(
+    datafile: str,
+    labelfile: str,
+    class_label: str,
+    index_col: str,
+    test_prop: float,
+    sep: str,
+    subset: Collection[Any],
+    stratify: bool,
+    batch_size: int,
+    refgenes: List[str]=None,
+    currgenes: List[str]=None,
+    normalize: bool=False,
+    skip: int=3,
+) -> Tuple[FastTensorDataLoader, FastTensorDataLoader, FastTensorDataLoader]:
+    """
+    Load the entire datafile into a single tensor and generate train/val/test FastTensorDataLoaders from it.
+
+    Gene alignment and normalization, which the CollateLoader path applies per batch in its
+    collate_fn, are applied here once over the whole matrix — opting into in_memory must not
+    change the features the model sees.
+
+    :return: train, val, test loaders
+    :rtype: Tuple[FastTensorDataLoader, FastTensorDataLoader, FastTensorDataLoader]
+    """
+    if refgenes is None and currgenes is not None or refgenes is not None and currgenes is None:
+        raise ValueError(
+            "If refgenes is passed, currgenes must be passed too."
+            "If currgenes is passed, refgenes must be passed too."
+        )
+
+    X = torch.from_numpy(
+        np.loadtxt(datafile, skiprows=skip - 1, delimiter=sep, dtype=np.float32)
+    )
+
+    if refgenes is not None:
+        X = clean_sample(X, refgenes, currgenes)
+
+    if normalize:
+        X = _transform_sample(X, normalize=True, transpose=False)
+
+    labels = pd.read_csv(labelfile, sep=sep)
+    if subset is not None:
+        labels = labels.loc[subset, :].reset_index(drop=True)
+
+    current_labels = labels.loc[:, class_label]
+    trainsplit, valsplit = train_test_split(
+        current_labels,
+        stratify=(current_labels if stratify else None),
+        test_size=test_prop,
+    )
+    trainsplit, testsplit = train_test_split(
+        trainsplit,
+        stratify=(trainsplit if stratify else None),
+        test_size=test_prop,
+    )
+
+    loaders = []
+    for split in [trainsplit, valsplit, testsplit]:
+        # index_col holds the actual row numbers of the samples we want, same as in GeneExpressionData
+        rows = (
+            labels.loc[split.index, index_col].to_numpy(dtype=np.int64) if index_col is not None
+            else split.index.to_numpy(dtype=np.int64)
+        )
+
+        loaders.append(
+            FastTensorDataLoader(
+                X[rows],
+                torch.as_tensor(split.to_numpy()),
+                batch_size=batch_size,
+                shuffle=True,
+            )
+        )
+
+    return loaders
 
 def generate_datasets(
     datafiles: List[str],
@@ -640,10 +1123,10 @@ def generate_datasets(
             **kwargs,
         )
 
-    train_datasets, val_datasets, test_datasets = [], [], []
-
-    for datafile, labelfile in zip(datafiles, labelfiles):
-        train, val, test = generate_single_dataset(
+    # Splitting each (datafile, labelfile) pair is independent, and the label reads release
+    # the GIL inside pandas, so fan the pairs out across threads instead of looping serially
+    results = Parallel(n_jobs=min(len(datafiles), os.cpu_count()), prefer='threads')(
+        delayed(generate_single_dataset)(
             datafile,
             labelfile,
             class_label,
@@ -651,10 +1134,12 @@ def generate_datasets(
             *args,
             **kwargs,
         )
+        for datafile, labelfile in zip(datafiles, labelfiles)
+    )
 
-        train_datasets.append(train)
-        val_datasets.append(val)
-        test_datasets.append(test)
+    train_datasets = [train for train, _, _ in results]
+    val_datasets = [val for _, val, _ in results]
+    test_datasets = [test for _, _, test in results]
 
     # Flexibility to generate single stratified dataset from a single file 
     # Just in generate_single_dataset
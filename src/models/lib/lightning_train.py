@@ -13,6 +13,7 @@ from functools import cached_property
 import pytorch_lightning as pl
 from pytorch_lightning.loggers import WandbLogger
 from pytorch_lightning.callbacks.early_stopping import EarlyStopping
+from pytorch_lightning.strategies import DDPStrategy
 from sklearn.preprocessing import LabelEncoder 
 
 from .data import generate_dataloaders, compute_class_weights
@@ -288,6 +289,12 @@ def generate_trainer(
 
     device = ('cuda:0' if torch.cuda.is_available() else 'cpu')
     print(f'Device is {device}')
+
+    # Shapes are fixed for an entire run (width/layers come from the search config), so cuDNN
+    # autotuning always pays for itself. TF32 matmuls are ~2x fp32 throughput on Ampere+ with
+    # no practical accuracy change, and both flags are harmless no-ops on CPU
+    torch.backends.cudnn.benchmark = True
+    torch.set_float32_matmul_precision('high')
     
     here = pathlib.Path(__file__).parent.absolute()
     data_path = os.path.join(here, '..', '..', '..', 'data')
@@ -327,8 +334,26 @@ def generate_trainer(
         weights=weights,
     )
     
+    # On multiple GPUs use DDP, not the default DataParallel, which is GIL-bound and scatters
+    # gradients through the main process. TabNet's mask path is static across steps, so
+    # static_graph is safe and lets DDP overlap the all-reduce with backward
+    num_gpus = (torch.cuda.device_count() if torch.cuda.is_available() else 0)
+
+    # Mixed precision: TabNet training is dominated by dense matmuls in the feature
+    # transformer and attention layers, a tensor-core workload. Prefer bf16 where supported
+    # since it needs no loss scaling, fall back to fp16 on older GPUs, fp32 on CPU
+    if num_gpus > 0:
+        precision = ('bf16' if torch.cuda.is_bf16_supported() else 16)
+    else:
+        precision = 32
+
     trainer = pl.Trainer(
-        gpus=(1 if torch.cuda.is_available() else 0),
+        gpus=num_gpus,
+        precision=precision,
+        strategy=(
+            DDPStrategy(static_graph=True, find_unused_parameters=False)
+            if num_gpus > 1 else None
+        ),
         auto_lr_find=False,
         # gradient_clip_val=0.5,
         logger=wandb_logger,
@@ -7,18 +7,16 @@ import json
 import zipfile 
 import io 
 import pytorch_lightning as pl 
-from scipy.sparse import csc_matrix 
 from pathlib import Path 
 from pytorch_tabnet.utils import (
     create_explain_matrix,
     ComplexEncoder,
 )
 import torch.nn.functional as F
-from torchmetrics.functional import accuracy, precision, recall 
+from torchmetrics import MetricCollection, Accuracy, Precision, Recall, F1Score
 from pytorch_tabnet.tab_network import TabNet
-import copy
 import warnings
-from functools import cached_property
+from collections import defaultdict
 
 class TabNetLightning(pl.LightningModule):
     def __init__(
@@ -44,11 +42,7 @@ class TabNetLightning(pl.LightningModule):
             'lr': 0.001,
             'weight_decay': 0.01,
         },
-        metrics: Dict[str, Callable]={
-            'accuracy': accuracy,
-            'precision': precision,
-            'recall': recall,
-        },
+        metrics: Dict[str, Callable]=None,
         scheduler_params: Dict[str, float]=None,
         weighted_metrics=False,
         weights=None,
@@ -64,10 +58,52 @@ class TabNetLightning(pl.LightningModule):
 
         self.optim_params = optim_params
         self.scheduler_params = scheduler_params
-        self.metrics = metrics
         self.weighted_metrics = weighted_metrics
-        self.weights = weights 
-        self.loss = loss 
+        # Buffer rather than plain attribute, so the weight vector rides self.to(device) once
+        # instead of cross_entropy implicitly copying it host-to-device on every step
+        self.register_buffer(
+            'class_weights',
+            (torch.as_tensor(weights, dtype=torch.float32) if weights is not None else None),
+        )
+        self.loss = (loss if loss is not None else F.cross_entropy)
+
+        # One stateful MetricCollection per stage instead of separate functional accuracy/precision/recall
+        # calls, so each step does a single pass over the logits rather than three. Registered as
+        # submodules, these also move with the model on .to(device)
+        average = ('weighted' if weighted_metrics else 'micro')
+        if metrics is None:
+            metrics = MetricCollection({
+                'accuracy': Accuracy(num_classes=output_dim, average=average),
+                'precision': Precision(num_classes=output_dim, average=average),
+                'recall': Recall(num_classes=output_dim, average=average),
+            })
+        else:
+            # Callers historically pass a dict of torchmetrics.functional callables; adapt those
+            # to their stateful equivalents so they run through the same single collection update
+            metric_classes = {
+                'accuracy': Accuracy,
+                'precision': Precision,
+                'recall': Recall,
+                'f1_score': F1Score,
+            }
+
+            collected = {}
+            for name, metric in metrics.items():
+                # Unwrap functools.partial so e.g. partial(f1_score, average='none') maps to F1Score
+                fn_name = getattr(metric, 'func', metric).__name__
+                if fn_name not in metric_classes:
+                    warnings.warn(f'No stateful equivalent for metric {name} ({fn_name}), skipping. Known metrics are {sorted(metric_classes)}.')
+                    continue
+
+                collected[name] = metric_classes[fn_name](num_classes=output_dim, average=average)
+
+            metrics = MetricCollection(collected)
+
+        # Keep the old log names, in particular weighted_val_accuracy which the early stopping callback monitors
+        prefix = ('weighted_' if weighted_metrics else '')
+        self.train_metrics = metrics.clone(prefix=f'{prefix}train_')
+        self.val_metrics = metrics.clone(prefix=f'{prefix}val_')
+        self.test_metrics = metrics.clone(prefix=f'{prefix}test_')
 
         if pretrained is not None:
             self._from_pretrained(**pretrained.get_params())
@@ -100,15 +136,25 @@ class TabNetLightning(pl.LightningModule):
             self.network.post_embed_dim,
         )
 
+        # dense @ csc hits scipy's transposed access path, which is drastically slower than the
+        # native direction. Keep a CSR copy of the transpose so the reduction in explain() runs
+        # as csr @ dense instead. float32 matches the masks TabNet emits and halves bytes moved
+        self.reducing_matrix_T = self.reducing_matrix.T.tocsr().astype(np.float32)
+
+        # The same matrix as a torch sparse CSR tensor, so explain() can reduce on the GPU with
+        # torch.sparse.mm instead of shipping every mask back over PCIe for a scipy dot
+        self._reducing_matrix_T_torch = torch.sparse_csr_tensor(
+            torch.from_numpy(self.reducing_matrix_T.indptr),
+            torch.from_numpy(self.reducing_matrix_T.indices),
+            torch.from_numpy(self.reducing_matrix_T.data),
+            size=self.reducing_matrix_T.shape,
+        )
+
     def forward(self, x):
         return self.network(x)
 
     def _compute_loss(self, y, y_hat):
-        # If user doesn't specify, just set to cross_entropy
-        if self.loss is None:
-            self.loss = F.cross_entropy 
-
-        return self.loss(y, y_hat, weight=self.weights)
+        return self.loss(y, y_hat, weight=self.class_weights)
 
     def _step(self, batch):
         x, y = batch
@@ -118,42 +164,51 @@ class TabNetLightning(pl.LightningModule):
 
         # Add the overall sparsity loss
         loss = loss - self.lambda_sparse * M_loss
-        return y, y_hat, loss
+
+        # argmax once here: the metrics accept integer class predictions directly, so they
+        # reduce B ints instead of each re-traversing the full B x C logits
+        preds = y_hat.argmax(-1).detach()
+        return y, preds, loss
 
     def training_step(self, batch, batch_idx):
-        y, y_hat, loss = self._step(batch)
+        y, preds, loss = self._step(batch)
 
-        self.log("train_loss", loss, logger=True, on_epoch=True, on_step=True)
-        self._compute_metrics(y_hat, y, 'train')
+        # Epoch-only logging: per-step logging forces a GPU->CPU sync on every batch, which
+        # serializes short TabNet steps. Aggregation is local, so no sync_dist needed here
+        self.log("train_loss", loss, logger=True, on_epoch=True, on_step=False)
+        self._compute_metrics(preds, y, 'train')
 
         return loss
 
     def validation_step(self, batch, batch_idx):
-        y, y_hat, loss = self._step(batch)
+        y, preds, loss = self._step(batch)
 
-        self.log("val_loss", loss, logger=True, on_epoch=True, on_step=True)
-        self._compute_metrics(y_hat, y, 'val')
+        self.log("val_loss", loss, logger=True, on_epoch=True, on_step=False, sync_dist=True)
+        self._compute_metrics(preds, y, 'val')
 
     def test_step(self, batch, batch_idx):
-        y, y_hat, loss = self._step(batch)
+        y, preds, loss = self._step(batch)
 
-        self.log("test_loss", loss, logger=True, on_epoch=True, on_step=True)
-        self._compute_metrics(y_hat, y, 'test')
+        self.log("test_loss", loss, logger=True, on_epoch=True, on_step=False, sync_dist=True)
+        self._compute_metrics(preds, y, 'test')
 
     def configure_optimizers(self):
+        # Read the dicts without popping: Lightning can call this again on resume or DDP
+        # re-init, and a mutated optim_params would silently fall into the hard-coded default
         if 'optimizer' in self.optim_params:
-            optimizer = self.optim_params.pop('optimizer')
-            optimizer = optimizer(self.parameters(), **self.optim_params)
+            optim_cls = self.optim_params['optimizer']
+            optim_kwargs = {k: v for k, v in self.optim_params.items() if k != 'optimizer'}
+            optimizer = optim_cls(self.parameters(), **optim_kwargs)
         else:
             optimizer = torch.optim.Adam(self.parameters(), lr=0.2, weight_decay=1e-5)
 
-        if self.scheduler_params is not None:
-            scheduler = self.scheduler_params.pop('scheduler')
-            scheduler = scheduler(optimizer, **self.scheduler_params)
-
         if self.scheduler_params is None:
             return optimizer
-        
+
+        scheduler_cls = self.scheduler_params['scheduler']
+        scheduler_kwargs = {k: v for k, v in self.scheduler_params.items() if k != 'scheduler'}
+        scheduler = scheduler_cls(optimizer, **scheduler_kwargs)
+
         return {
             'optimizer': optimizer,
             'lr_scheduler': scheduler,
@@ -161,7 +216,7 @@ class TabNetLightning(pl.LightningModule):
         }
     
     def _compute_metrics(self, 
-        y_hat: torch.Tensor, 
+        preds: torch.Tensor, 
         y: torch.Tensor, 
         tag: str,
         on_epoch=True, 
@@ -170,62 +225,59 @@ class TabNetLightning(pl.LightningModule):
         """
         Compute metrics for the given batch
 
-        :param y_hat: logits of model
-        :type y_hat: torch.Tensor
+        :param preds: predicted class indices, already argmaxed from the logits in _step
+        :type preds: torch.Tensor
         :param y: tensor of labels
         :type y: torch.Tensor
         :param tag: log name, to specify train/val/test batch calculation
         :type tag: str
         :param on_epoch: log on epoch, defaults to True
         :type on_epoch: bool, optional
-        :param on_step: log on step, defaults to True
+        :param on_step: log on step. Off by default, since per-step logging costs a host sync per batch
         :type on_step: bool, optional
         """
-        for name, metric in self.metrics.items():
-            if self.weighted_metrics: # We dont consider class support in calculation
-                val = metric(y_hat, y, average='weighted', num_classes=self.output_dim)
-                self.log(
-                    f"weighted_{tag}_{name}", 
-                    val, 
-                    on_epoch=on_epoch, 
-                    on_step=on_step,
-                    logger=True,
-                )
-            else:
-                val = metric(y_hat, y, num_classes=self.output_dim)
-                self.log(
-                    f"{tag}_{name}", 
-                    val, 
-                    on_epoch=on_epoch, 
-                    on_step=on_step,
-                    logger=True,
-                )
+        metrics = getattr(self, f'{tag}_metrics')
+
+        self.log_dict(
+            metrics(preds, y),
+            on_epoch=on_epoch,
+            on_step=on_step,
+            logger=True,
+        )
 
     def explain(self, loader, normalize=False):
         self.network.eval()
-        res_explain = []
-
-        for batch_nb, data in enumerate(loader):
-            if isinstance(data, tuple): # if we are running this on already labeled pairs and not just for inference
-                data, _ = data 
-                
-            M_explain, masks = self.network.forward_masks(data)
-            for key, value in masks.items():
-                masks[key] = csc_matrix.dot(
-                    value.cpu().detach().numpy(), self.reducing_matrix
-                )
-
-            original_feat_explain = csc_matrix.dot(M_explain.cpu().detach().numpy(),
-                                                   self.reducing_matrix)
-            res_explain.append(original_feat_explain)
-
-            if batch_nb == 0:
-                res_masks = masks
-            else:
+        explain_chunks = []
+        mask_chunks = defaultdict(list)
+
+        # inference_mode skips autograd bookkeeping entirely (cheaper than no_grad), and
+        # nothing here needs gradients
+        with torch.inference_mode():
+            for data in loader:
+                if isinstance(data, tuple): # if we are running this on already labeled pairs and not just for inference
+                    data, _ = data
+
+                M_explain, masks = self.network.forward_masks(data)
+                explain_chunks.append(M_explain)
                 for key, value in masks.items():
-                    res_masks[key] = np.vstack([res_masks[key], value])
+                    mask_chunks[key].append(value)
+
+        # Concatenate each matrix once and run one big sparse reduction per key, instead of a
+        # scipy dot per batch plus vstacks that re-copy the growing result every iteration.
+        # (R^T @ X^T)^T == X @ R, but runs in CSR's natively fast row-major direction
+        if explain_chunks[0].is_cuda:
+            # Reduce where the forward pass ran: one parallel sparse matmul per key on the GPU,
+            # and a single device-to-host copy of the already-reduced result
+            reducer = self._reducing_matrix_T_torch.to(explain_chunks[0].device)
+
+            def _reduce(chunks):
+                return torch.sparse.mm(reducer, torch.cat(chunks).T).T.cpu().numpy()
+        else:
+            def _reduce(chunks):
+                return (self.reducing_matrix_T @ torch.cat(chunks).numpy().T).T
 
-        res_explain = np.vstack(res_explain)
+        res_explain = _reduce(explain_chunks)
+        res_masks = {key: _reduce(chunks) for key, chunks in mask_chunks.items()}
 
         if normalize:
             res_explain /= np.sum(res_explain, axis=1)[:, None]
@@ -299,17 +351,21 @@ class TabNetLightning(pl.LightningModule):
         self.load_class_attrs(loaded_params["class_attrs"])
 
     def load_weights_from_unsupervised(self, unsupervised_model):
-        update_state_dict = copy.deepcopy(self.network.state_dict())
+        # Shallow dict is enough: load_state_dict copies the tensors into the network's own
+        # parameters, so there's no need to deepcopy every weight first
+        update_state_dict = dict(self.network.state_dict())
         for param, weights in unsupervised_model.network.state_dict().items():
             if param.startswith("encoder"):
                 # Convert encoder's layers name to match
                 new_param = "tabnet." + param
             else:
                 new_param = param
-            if self.network.state_dict().get(new_param) is not None:
+            if update_state_dict.get(new_param) is not None:
                 # update only common layers
                 update_state_dict[new_param] = weights
 
+        self.network.load_state_dict(update_state_dict)
+
     def _from_pretrained(self, **kwargs):
         update_list = [
             "cat_dims",
@@ -323,13 +379,15 @@ class TabNetLightning(pl.LightningModule):
             "n_shared",
             "n_steps",
         ]
+        # Sentinel distinguishes "attribute not set yet" from any real value, including None
+        missing = object()
         for var_name, value in kwargs.items():
-            if var_name in update_list:
-                try:
-                    exec(f"global previous_val; previous_val = self.{var_name}")
-                    if previous_val != value:  # noqa
-                        wrn_msg = f"Pretraining: {var_name} changed from {previous_val} to {value}"  # noqa
-                        warnings.warn(wrn_msg)
-                        exec(f"self.{var_name} = value")
-                except AttributeError:
-                    exec(f"self.{var_name} = value")
+            if var_name not in update_list:
+                continue
+
+            previous_val = getattr(self, var_name, missing)
+            if previous_val is missing:
+                setattr(self, var_name, value)
+            elif previous_val != value:
+                warnings.warn(f"Pretraining: {var_name} changed from {previous_val} to {value}")
+                setattr(self, var_name, value)
@@ -34,13 +34,22 @@ class DelimitedTestData(Dataset):
         **kwargs, # To handle extraneous inputs
     ):
         self.datafile = datafile
+        self.index_col = index_col
         self.skip = skip
         self.cast = cast
         self.sep = sep
         self._cols = columns
 
         if indexfile is not None:
-            self.index_df = pd.read_csv(indexfile, index_col=index_col).reset_index()
+            self._labeldf = pd.read_csv(indexfile, index_col=index_col).reset_index()
+            # Cache the data file line numbers as a plain int array so __getitem__ doesn't pay
+            # for a pandas label lookup on every sample
+            self._data_indices = (
+                self._labeldf[self.index_col].to_numpy(dtype=np.int64) if self.index_col is not None else None
+            )
+        else:
+            self._labeldf = None
+            self._data_indices = None
 
     def __getitem__(self, idx: int):
         """Get sample at index
@@ -64,7 +73,7 @@ class DelimitedTestData(Dataset):
 
         # The actual line in the datafile to get, corresponding to the number in the self.index_col values, otherwise the line at index "idx"
         data_index = (
-            self._labeldf.loc[idx, self.index_col] if self.index_col is not None else idx
+            int(self._data_indices[idx]) if self._data_indices is not None else idx
         )
 
         # get gene expression for current cell from csv file
@@ -72,7 +81,8 @@ class DelimitedTestData(Dataset):
         line = linecache.getline(self.datafile, data_index + self.skip)
         
         if self.cast:
-            data = torch.from_numpy(np.array(line.split(self.sep), dtype=np.float32)).float()
+            # Parse the line in C rather than allocating a Python string per gene, same as GeneExpressionData
+            data = torch.from_numpy(np.fromstring(line, sep=self.sep, dtype=np.float32))
         else:
             data = np.array(line.split(self.sep))
 
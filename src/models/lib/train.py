@@ -9,14 +9,12 @@ import numpy as np
 import pytorch_lightning as pl
 import wandb 
 
-from functools import partial 
-from torchmetrics.functional import accuracy, f1_score, precision, recall
+from torchmetrics import MetricCollection, Accuracy, Precision, Recall, F1Score
 from sklearn.utils.class_weight import compute_class_weight
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
 from helper import upload, seed_everything
-from .data import clean_sample
 
 # reproducibility over all workers
 def seed_worker(worker_id):
@@ -24,28 +22,53 @@ def seed_worker(worker_id):
     np.random.seed(worker_seed)
     random.seed(worker_seed)
 
+# One stateful MetricCollection per (num_classes, device, mode), built lazily. A single
+# collection update makes one pass over the logits instead of six separate functional calls,
+# and accumulating between logging boundaries gives rolling statistics over the window instead
+# of a single-batch snapshot. Keying by mode keeps each phase's accumulator separate, so
+# training updates can never leak into validation metrics or vice versa
+_metric_collections = {}
+
+def _get_metrics(num_classes: int, device, mode: str='') -> MetricCollection:
+    key = (num_classes, str(device), mode)
+    if key not in _metric_collections:
+        _metric_collections[key] = MetricCollection({
+            'micro_accuracy': Accuracy(average='micro', num_classes=num_classes),
+            'macro_accuracy': Accuracy(average='macro', num_classes=num_classes),
+            'weighted_accuracy': Accuracy(average='weighted', num_classes=num_classes),
+            'f1': F1Score(),
+            'precision': Precision(),
+            'recall': Recall(),
+        }).to(device)
+
+    return _metric_collections[key]
+
 def train_val_loop(
     model, 
     trainloaders, 
     valloaders, 
-    refgenes,
     criterion,
     optimizer,
     mod,
 ):
     wandb.init()
     wandb.watch(model)
+
+    # Hoist the batch totals out of the epoch loop. Note the epoch averages below previously
+    # both divided by the length of the last *train* loader, so epoch_val_loss was wrong
+    # whenever the loaders differed in size
+    n_train_batches = sum(len(train) for train in trainloaders)
+    n_val_batches = sum(len(val) for val in valloaders)
     for epoch in range(1000):  # loop over the dataset multiple times
         print(f'{epoch = }')
         running_loss = 0.0
         epoch_loss = 0.0
-        # Train loop
+        # Train loop. Gene alignment (clean_sample) happens in the CollateLoader's collate_fn,
+        # inside the dataloader workers, so batches arrive here already aligned to the refgenes
         model.train()
         for train in trainloaders:
             for i, data in enumerate(train):
                 inputs, labels = data
-                # CLEAN INPUTS
-                inputs = clean_sample(inputs, refgenes, train.dataset.columns)
                 # Forward pass ➡
                 outputs = model(inputs)
                 loss = criterion(outputs, labels)
@@ -57,9 +80,10 @@ def train_val_loop(
                 # Step with optimizer
                 optimizer.step()
 
-                # print statistics
-                running_loss += loss.item()
-                epoch_loss += loss.item()
+                # Accumulate detached tensors: .item() forces a host sync per batch, the
+                # float conversion happens once at the logging boundary instead
+                running_loss += loss.detach()
+                epoch_loss += loss.detach()
 
                 if i % mod == 0: # record every 2000 mini batches 
                     metric_results = calculate_metrics(
@@ -70,13 +94,13 @@ def train_val_loop(
                         subset='weighted_accuracy',
                     )
 
-                    wandb.log(metric_results)
-                    running_loss = running_loss / mod
-                    wandb.log({f"batch_train_loss": loss})
+                    # One wandb.log call per boundary: every call is a pickle + IPC round
+                    # trip to the wandb process, so coalesce the payload
+                    wandb.log({**metric_results, 'batch_train_loss': loss.detach()})
 
                     running_loss = 0.0
                 
-        wandb.log({f"epoch_train_loss": epoch_loss / len(train)})
+        wandb.log({f"epoch_train_loss": float(epoch_loss) / n_train_batches})
         
         model.eval()
         with torch.no_grad(): # save memory but not computing gradients 
@@ -86,21 +110,14 @@ def train_val_loop(
             for val in valloaders:
                 for i, data in enumerate(val):
                     inputs, labels = data
-                    # CLEAN INPUTS
-                    inputs = clean_sample(inputs, refgenes, val.dataset.columns)
                     # Forward pass ➡
                     outputs = model(inputs)
                     loss = criterion(outputs, labels)
 
-                    # print statistics
-                    running_loss += loss.item()
-                    epoch_loss += loss.item()
-
-                    if i % mod == 0: #every 2000 mini batches 
-                        running_loss = running_loss / mod
-                        wandb.log({"val_loss": loss})
-                        running_loss = 0.0
+                    running_loss += loss.detach()
+                    epoch_loss += loss.detach()
 
+                    if i % mod == 0: #every 2000 mini batches
                         metric_results = calculate_metrics(
                             outputs=outputs,
                             labels=labels,
@@ -109,14 +126,14 @@ def train_val_loop(
                             append_str='val',
                         )
 
-                    wandb.log(metric_results)
-        
-            wandb.log({f"epoch_val_loss": epoch_loss / len(train)})
+                        wandb.log({**metric_results, 'val_loss': loss.detach()})
+                        running_loss = 0.0
+
+            wandb.log({f"epoch_val_loss": float(epoch_loss) / n_val_batches})
 
 def test_loop(
     model,
     testloaders,
-    refgenes,
     criterion,
     mod,
 ):
@@ -127,15 +144,12 @@ def test_loop(
             running_loss = 0.0
             for i, data in enumerate(test):
                 inputs, labels = data
-                # CLEAN INPUTS
-                inputs = clean_sample(inputs, refgenes, test.dataset.columns)
                 outputs = model(inputs)
                 loss = criterion(outputs, labels)
 
-                # print statistics
-                running_loss += loss.item()
+                running_loss += loss.detach()
                 if i % mod == 0: #every 2000 mini batches 
-                    running_loss = running_loss / mod
+                    running_loss = float(running_loss) / mod
                     wandb.log({"test_loss": loss})
                     running_loss = 0.0
 
@@ -157,29 +171,22 @@ def calculate_metrics(
     subset: List[str]=None,
 ) -> Dict[str, float]:
 
-    metrics = {
-        'micro_accuracy': partial(accuracy, average='micro', num_classes=num_classes),
-        'macro_accuracy': partial(accuracy, average='macro', num_classes=num_classes),
-        'weighted_accuracy': partial(accuracy, average='weighted', num_classes=num_classes),
-        'f1': f1_score,
-        'precision': precision,
-        'recall': recall,
-    }
-    results = {}
+    # Namespaced separately from _inner_computation's rolling collections, since this computes
+    # and resets per call and would otherwise clobber any window accumulating under the same mode
+    metrics = _get_metrics(num_classes, outputs.device, f'{append_str}_batch')
+    # argmax once so every metric reduces over integer predictions instead of full logit rows
+    preds = (outputs.argmax(-1) if outputs.ndim > 1 else outputs)
+    metrics.update(preds, labels)
+    results = metrics.compute()
+    metrics.reset()
 
     subset = ([subset] if isinstance(subset, str) else subset)
-    subset = (metrics.keys() if subset is None else subset)
-
-    for name in subset:
-        metric = metrics[name]
-        res = metric(
-            preds=outputs,
-            target=labels,
-        )
-        
-        results[f"{name}{f'_{append_str}' if append_str else ''}"] = res
-    
-    return results 
+    subset = (results.keys() if subset is None else subset)
+
+    return {
+        f"{name}{f'_{append_str}' if append_str else ''}": results[name]
+        for name in subset
+    }
 
 def _inner_computation(
     data,
@@ -188,15 +195,12 @@ def _inner_computation(
     criterion,
     i, 
     running_loss,
-    refgenes,
-    currgenes,
     mode=['train', 'val', 'test'],
     wandb=None,
     record=None,
     quiet=True,
 ):
     inputs, labels = data
-    inputs = clean_sample(inputs, refgenes, currgenes)
     outputs, M_loss = model(inputs)
     loss = criterion(outputs, labels)
     
@@ -205,16 +209,23 @@ def _inner_computation(
         loss.backward()
         optimizer.step()
 
-    running_loss += loss.item()
+    running_loss += loss.detach()
+
+    # Updating the collection is cheap (no compute pass); the actual metric computation and
+    # reset only happen at the logging boundary, over everything seen since the last one
+    metrics = _get_metrics(model.output_dim, outputs.device, mode)
+    if i == 0:
+        # Start of a phase: drop whatever accumulated past the last logging boundary of the
+        # previous pass, so this phase's first window only ever contains its own batches
+        metrics.reset()
+    metrics.update(outputs.argmax(-1), labels)
 
     if i % 100 == 0:
-        running_loss = running_loss / 100
-        metric_results = calculate_metrics(
-            outputs=outputs,
-            labels=labels,
-            append_str=mode,
-            num_classes=model.output_dim
-        )
+        running_loss = float(running_loss) / 100
+        metric_results = {
+            f'{name}_{mode}': val for name, val in metrics.compute().items()
+        }
+        metrics.reset()
         
         if record is not None:
             record.append(running_loss)
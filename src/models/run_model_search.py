@@ -2,10 +2,9 @@ import random
 import pathlib 
 import os 
 import argparse
-import ast 
-from itertools import product 
+import string
+import subprocess
 
-import numpy as np 
 from scipy.stats import loguniform
 
 def run_search(
@@ -24,6 +23,13 @@ def run_search(
     here = pathlib.Path(__file__).parent.absolute()
     yaml_path = os.path.join(here, '..', '..', 'yaml', 'model.yaml')
 
+    # Read the job template once and render it in Python. string.Template understands the
+    # same $VAR/${VAR} syntax as envsubst, so this replaces the old
+    # 'envsubst < yaml | kubectl create -f -' pipeline that forked a shell plus two
+    # processes for every sampled config
+    with open(yaml_path) as f:
+        template = string.Template(f.read())
+
     param_dict = {
         'weighted_metrics': [True],
         'class_label': [class_label],
@@ -34,18 +40,24 @@ def run_search(
         'weight_decay': loguniform.rvs(0.001, 0.1, size=10),
     }
     
-    # Generate cartesian product of dictionary 
-    params = list(product(*param_dict.values()))
+    # Sample each axis independently instead of materializing the full cartesian product,
+    # which grows multiplicatively with every new hyperparameter. Constant memory, and
+    # statistically equivalent for random search. Convert the loguniform draws to plain
+    # lists once so random.choice isn't doing numpy scalar indexing on every draw
+    param_values = [list(v) for v in param_dict.values()]
     param_names = list(param_dict.keys())
-    
-    for i, params in enumerate(random.sample(params, N)):
+
+    for i in range(N):
+        params = [random.choice(v) for v in param_values]
         for n, p in zip(param_names, params):
             os.environ[n.upper()] = str(p)
 
         # These two are to put in job name
         os.environ['NAME'] = class_label.lower()
-        os.environ['I'] = str(i) 
-        os.system(f'envsubst < {yaml_path} | kubectl create -f -')
+        os.environ['I'] = str(i)
+
+        body = template.safe_substitute(os.environ)
+        subprocess.run(['kubectl', 'create', '-f', '-'], input=body, text=True, check=True)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(usage='Hyperparameter tune with random search.')
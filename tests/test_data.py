@@ -184,6 +184,148 @@ class TestData(unittest.TestCase):
             for x, y in zip(X, Y):
                 self.assertEqual(x[0], y)
 
+    def test_dataset_from_memmap(self):
+        datafile = os.path.join(self.datapath, 'test_data_memmap.csv')
+        labelfile = os.path.join(self.datapath, 'test_labels_memmap.csv')
+
+        # Same synthetic fixture as the csv test, row_i = (i, ..., i)
+        df = pd.DataFrame(index=range(25), columns=[f'col_{i}' for i in range(10)])
+        for i in range(25):
+            df.loc[i, :] = [i]*10
+
+        labels = pd.DataFrame(index=range(25), columns=['index_col', 'label'])
+        labels['index_col'] = [int(x) for x in random.sample(list(df.index), k=len(df))]
+        labels['label'] = labels['index_col']
+
+        labels.to_csv(labelfile, index=False)
+        df.to_csv(datafile)
+
+        # Build the binary memmap next to the csv, which GeneExpressionData should autodetect
+        build_memmap(datafile, skip=2)
+        self.assertTrue(os.path.isfile(f'{datafile}.f32'))
+        self.assertTrue(os.path.isfile(f'{datafile}.f32.json'))
+
+        data = GeneExpressionData(
+            datafile,
+            labelfile,
+            class_label='label',
+            index_col='index_col',
+            skip=2,
+        )
+
+        # Make sure samples are served from the memmap, not the csv fallback
+        self.assertIsNotNone(data._memmap)
+
+        # Per-sample reads: the index_col -> row mapping must survive the binary conversion
+        for i in range(len(data)):
+            X, y = data[i]
+            self.assertEqual(X[0], y)
+
+        # And the vectorized batch fetch must agree with per-sample reads
+        for X, y in data.__getitems__(list(range(len(data)))):
+            self.assertEqual(X[0], y)
+
+        # scale=True divides by the per-gene maxima recorded during the memmap build, 24 here
+        scaled = GeneExpressionData(
+            datafile,
+            labelfile,
+            class_label='label',
+            index_col='index_col',
+            skip=2,
+            scale=True,
+        )
+
+        for i in range(len(scaled)):
+            X, y = scaled[i]
+            self.assertAlmostEqual(float(X[0]), float(y) / 24, places=5)
+
+    def test_dataset_from_npy(self):
+        datafile = os.path.join(self.datapath, 'test_data_npy.parquet')
+        labelfile = os.path.join(self.datapath, 'test_labels_npy.csv')
+
+        df = pd.DataFrame(index=range(25), columns=[f'col_{i}' for i in range(10)], dtype=np.float32)
+        for i in range(25):
+            df.loc[i, :] = [i]*10
+
+        labels = pd.DataFrame(index=range(25), columns=['index_col', 'label'])
+        labels['index_col'] = [int(x) for x in random.sample(list(df.index), k=len(df))]
+        labels['label'] = labels['index_col']
+
+        labels.to_csv(labelfile, index=False)
+        df.to_parquet(datafile)
+
+        npyfile = build_npy(datafile)
+        self.assertTrue(os.path.isfile(npyfile))
+
+        data = GeneExpressionData(
+            npyfile,
+            labelfile,
+            class_label='label',
+            index_col='index_col',
+            columns=list(df.columns),
+        )
+
+        for i in range(len(data)):
+            X, y = data[i]
+            self.assertEqual(X[0], y)
+
+        for X, y in data.__getitems__(list(range(len(data)))):
+            self.assertEqual(X[0], y)
+
+    def test_fast_tensor_dataloader(self):
+        # row_i = (i, ..., i) with label i, so x[0] == y identifies each sample
+        X = torch.arange(25, dtype=torch.float32).unsqueeze(1).repeat(1, 10)
+        y = torch.arange(25)
+
+        for shuffle in [False, True]:
+            loader = FastTensorDataLoader(X, y, batch_size=4, shuffle=shuffle)
+
+            seen = []
+            for bx, by in loader:
+                for x_row, y_val in zip(bx, by):
+                    self.assertEqual(x_row[0], y_val)
+                seen.extend(by.tolist())
+
+            # Each sample appears exactly once per epoch, shuffled or not
+            self.assertEqual(sorted(seen), list(range(25)))
+            if not shuffle:
+                self.assertEqual(seen, list(range(25)))
+
+    def test_in_memory_dataloaders(self):
+        datafile = os.path.join(self.datapath, 'test_data_in_memory.csv')
+        labelfile = os.path.join(self.datapath, 'test_labels_in_memory.csv')
+
+        df = pd.DataFrame(index=range(25), columns=[f'col_{i}' for i in range(10)])
+        for i in range(25):
+            df.loc[i, :] = [i]*10
+
+        labels = pd.DataFrame(index=range(25), columns=['index_col', 'label'])
+        labels['index_col'] = [int(x) for x in random.sample(list(df.index), k=len(df))]
+        labels['label'] = labels['index_col']
+
+        labels.to_csv(labelfile, index=False)
+        df.to_csv(datafile)
+
+        train, val, test = generate_single_dataloader(
+            datafile=datafile,
+            labelfile=labelfile,
+            class_label='label',
+            index_col='index_col',
+            test_prop=0.2,
+            sep=',',
+            subset=None,
+            stratify=False,
+            batch_size=4,
+            num_workers=0,
+            in_memory=True,
+            skip=2,
+        )
+
+        for loader in [train, val, test]:
+            for bx, by in loader:
+                for x_row, y_val in zip(bx, by):
+                    self.assertEqual(x_row[0], y_val)
+
     def test_dataloader_from_h5ad(self):
         train, val, test = generate_dataloaders(
             datafiles=[self.datafile_h5ad],